@@ -4,10 +4,10 @@ Chat CLI 项目安装脚本
 使用setuptools标准打包
 """
 
+import os
 import sys
-import subprocess
+import functools
 import shutil
-import glob
 from pathlib import Path
 from setuptools import setup, find_packages
 
@@ -22,28 +22,42 @@ def read_file(filename):
             return f.read()
     return ""
 
+# poetry 版本约束前缀到 setuptools 写法的映射
+VERSION_PREFIXES = {'^': '>='}
+
+@functools.lru_cache(maxsize=1)
+def _load_pyproject():
+    """解析pyproject.toml（只解析一次），失败时返回空字典"""
+    if sys.version_info >= (3, 11):
+        import tomllib
+    else:
+        try:
+            import tomli as tomllib
+        except ImportError:
+            return {}
+
+    pyproject_path = project_root / "pyproject.toml"
+    if not pyproject_path.exists():
+        return {}
+    with open(pyproject_path, 'rb') as f:
+        return tomllib.load(f)
+
 def get_requirements():
     """从pyproject.toml获取依赖信息，如果失败则使用默认依赖"""
-    try:
-        import tomli
-        pyproject_path = project_root / "pyproject.toml"
-        if pyproject_path.exists():
-            with open(pyproject_path, 'rb') as f:
-                data = tomli.load(f)
-                deps = data.get('tool', {}).get('poetry', {}).get('dependencies', {})
-                # 过滤掉python版本要求，转换为setuptools格式
-                requirements = []
-                for name, version in deps.items():
-                    if name != 'python':
-                        if isinstance(version, str):
-                            if version.startswith('^'):
-                                version = '>=' + version[1:]
-                            requirements.append(f"{name}{version}")
-                        else:
-                            requirements.append(name)
-                return requirements
-    except ImportError:
-        pass
+    deps = _load_pyproject().get('tool', {}).get('poetry', {}).get('dependencies', {})
+    if deps:
+        # 过滤掉python版本要求，转换为setuptools格式
+        requirements = []
+        for name, version in deps.items():
+            if name != 'python':
+                if isinstance(version, str):
+                    prefix = VERSION_PREFIXES.get(version[:1])
+                    if prefix:
+                        version = prefix + version[1:]
+                    requirements.append(f"{name}{version}")
+                else:
+                    requirements.append(name)
+        return requirements
     
     # 回退到默认依赖
     return [
@@ -56,17 +70,7 @@ def get_requirements():
 
 def get_version():
     """从pyproject.toml获取版本信息，如果失败则使用默认版本"""
-    try:
-        import tomli
-        pyproject_path = project_root / "pyproject.toml"
-        if pyproject_path.exists():
-            with open(pyproject_path, 'rb') as f:
-                data = tomli.load(f)
-                return data.get('tool', {}).get('poetry', {}).get('version', '0.1.0')
-    except ImportError:
-        pass
-    
-    return "0.1.0"
+    return _load_pyproject().get('tool', {}).get('poetry', {}).get('version', '0.1.0')
 
 def setup_environment():
     """设置环境文件"""
@@ -82,24 +86,48 @@ def run_tests():
     """运行测试"""
     print("🧪 运行测试...")
     try:
-        subprocess.run([sys.executable, "-m", "pytest", "tests/", "-v"], check=True)
+        import pytest
+    except ImportError:
+        # 当前解释器没有 pytest 时，用同一解释器起子进程也无法运行
+        print("❌ 未安装 pytest，请先运行: pip install -e .[dev]")
+        return False
+    
+    # 直接在当前解释器中运行 pytest，避免再启动一个 Python 进程
+    passed = pytest.main(["tests/", "-v"]) == 0
+    if passed:
         print("✅ 所有测试通过")
-        return True
-    except subprocess.CalledProcessError:
+    else:
         print("❌ 测试失败")
-        return False
+    return passed
 
-def clean_build():
+# clean 命令只在项目根目录删除的构建产物（另含 *.egg-info）
+CLEAN_ROOT_DIRS = frozenset({'build', 'dist'})
+# clean 命令在整个项目中递归删除的缓存目录
+CLEAN_CACHE_DIRS = frozenset({'__pycache__', '.pytest_cache'})
+# 遍历时跳过的版本库、虚拟环境和工具缓存目录
+CLEAN_SKIP_DIRS = frozenset({
+    '.git', '.venv', 'venv', 'env', '.tox', '.nox', '.mypy_cache', '.ruff_cache',
+})
+
+def clean_build(root=project_root):
     """清理构建文件"""
     print("🧹 清理构建文件...")
-    patterns = ['build', 'dist', '*.egg-info', '__pycache__', '.pytest_cache']
-    for pattern in patterns:
-        for path in glob.glob(pattern, recursive=True):
-            path_obj = Path(path)
-            if path_obj.is_dir():
-                shutil.rmtree(path_obj)
-            else:
-                path_obj.unlink()
+    root = Path(root)
+    # build/dist/*.egg-info 只匹配项目根目录，避免误删依赖包或用户目录
+    for path in root.iterdir():
+        if path.is_dir() and (path.name in CLEAN_ROOT_DIRS or path.name.endswith('.egg-info')):
+            shutil.rmtree(path, ignore_errors=True)
+    
+    # 缓存目录递归清理，只遍历一次目录树
+    for dirpath, dirnames, _ in os.walk(root):
+        for name in list(dirnames):
+            path = os.path.join(dirpath, name)
+            if name in CLEAN_SKIP_DIRS or os.path.exists(os.path.join(path, 'pyvenv.cfg')):
+                # 跳过虚拟环境（包括任意命名的 venv）
+                dirnames.remove(name)
+            elif name in CLEAN_CACHE_DIRS:
+                shutil.rmtree(path, ignore_errors=True)
+                dirnames.remove(name)
     print("✅ 清理完成")
 
 def print_help():
@@ -193,8 +221,12 @@ def main():
         author="Your Name",
         author_email="your.email@example.com",
         url="https://github.com/your-username/chat-cli",
-        packages=find_packages(where="src"),
-        package_dir={"": "src"},
+        # src 目录以 chat_cli 包名安装，避免占用通用的顶层包名 src
+        packages=["chat_cli"] + [
+            f"chat_cli.{name}"
+            for name in find_packages(where="src", exclude=("tests", "tests.*", "*.tests", "*.tests.*"))
+        ],
+        package_dir={"chat_cli": "src"},
         python_requires=">=3.8.1",
         install_requires=get_requirements(),
         extras_require={
@@ -208,7 +240,7 @@ def main():
         },
         entry_points={
             'console_scripts': [
-                'chat-cli=src.main:cli',
+                'chat-cli=chat_cli.main:cli',
             ],
         },
         classifiers=[
@@ -1,50 +1,141 @@
 """OpenAI compatible API client module."""
 
 import os
-import platform
+import stat
+import sys
+import functools
 from pathlib import Path
-from typing import Optional, List, Dict, Any, Generator
-from openai import OpenAI
-from dotenv import load_dotenv
+from typing import Optional, List, Dict, Any, Generator, Tuple
 
+DEFAULT_BASE_URL = "https://api.openai.com/v1"
+DEFAULT_MODEL = "gpt-3.5-turbo"
+DEFAULT_SYSTEM_PROMPT = "You are a helpful assistant"
+# 默认系统消息在各次请求间共享，请求过程中不会被修改
+_DEFAULT_SYSTEM_MSG = {"role": "system", "content": DEFAULT_SYSTEM_PROMPT}
 
+
+@functools.lru_cache(maxsize=1)
 def get_config_dir():
     """获取跨平台配置目录"""
-    if platform.system() == "Windows":
+    if sys.platform == "win32":
         # Windows: 使用 APPDATA 目录
-        appdata = os.getenv('APPDATA')
+        appdata = os.environ.get('APPDATA')
         if appdata:
             return Path(appdata) / "chat-cli"
         else:
             # 回退到用户目录
             return Path.home() / "AppData" / "Roaming" / "chat-cli"
-    elif platform.system() == "Darwin":
+    elif sys.platform == "darwin":
         # macOS: 使用标准应用程序支持目录
         return Path.home() / "Library" / "Application Support" / "chat-cli"
     else:
         # Linux/Unix: 使用 XDG 标准或 .config
-        xdg_config_home = os.getenv('XDG_CONFIG_HOME')
+        xdg_config_home = os.environ.get('XDG_CONFIG_HOME')
         if xdg_config_home:
             return Path(xdg_config_home) / "chat-cli"
         else:
             return Path.home() / ".config" / "chat-cli"
 
 
+@functools.lru_cache(maxsize=1)
+def get_config_file():
+    """获取全局配置文件路径"""
+    return get_config_dir() / "env"
+
+
+@functools.lru_cache(maxsize=None)
+def _parse_env_file(path: str, mtime_ns: int, size: int, ino: int) -> Dict[str, str]:
+    """解析 env 文件，按 (绝对路径, 修改时间, 大小, inode) 缓存，文件改动后自动失效"""
+    from dotenv import dotenv_values
+
+    return {key: value for key, value in dotenv_values(path).items() if value is not None}
+
+
+def read_env_file(path) -> Optional[Dict[str, str]]:
+    """读取 env 文件中的配置项，文件不存在时返回 None"""
+    # 使用绝对路径，避免切换工作目录后相对路径（如 .env）命中旧缓存
+    path = os.path.abspath(path)
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    if not stat.S_ISREG(st.st_mode):
+        # 目录等非普通文件视为不存在
+        return None
+    if not st.st_size:
+        # 空文件无需解析
+        return {}
+    # 时间戳精度较粗的文件系统上同一时刻内的改写 mtime 不变，大小和 inode 可以补充区分
+    return dict(_parse_env_file(path, st.st_mtime_ns, st.st_size, st.st_ino))
+
+
+def clear_env_cache():
+    """清空 env 文件解析缓存，env 文件改动后调用"""
+    _parse_env_file.cache_clear()
+    load_env_files.cache_clear()
+
+
+def _load_env_file(path, override: bool = False):
+    """把 env 文件加载到环境变量，不存在或不是普通文件时跳过"""
+    from dotenv import load_dotenv
+
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return
+    if not stat.S_ISREG(st.st_mode):
+        # 目录等非普通文件视为不存在
+        return
+    with open(path, encoding='utf-8') as f:
+        load_dotenv(stream=f, override=override)
+
+
+@functools.lru_cache(maxsize=1)
 def load_env_files():
-    """Load environment variables from multiple sources."""
+    """Load environment variables from multiple sources (once per process, see clear_env_cache)."""
     # Load from global config directory first - 使用跨平台配置目录
-    global_config_dir = get_config_dir()
-    global_env_file = global_config_dir / "env"
-    
-    if global_env_file.exists():
-        load_dotenv(global_env_file)
+    _load_env_file(get_config_file())
     
     # Load from local .env file (this will override global settings)
-    load_dotenv(override=True)
+    if os.environ.get('CHAT_CLI_DOTENV_WALK') == '1':
+        # 按需向上级目录查找 .env
+        from dotenv import find_dotenv
+        dotenv_path = find_dotenv(usecwd=True)
+        if dotenv_path:
+            _load_env_file(dotenv_path, override=True)
+    else:
+        _load_env_file(Path.cwd() / ".env", override=True)
 
 
-# Load environment variables from multiple sources
-load_env_files()
+def resolve_config() -> Tuple[str, str, str]:
+    """加载 env 文件并返回当前生效的 (api_key, base_url, model)"""
+    load_env_files()
+    
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise ValueError("OPENAI_API_KEY environment variable is required")
+    
+    return (
+        api_key,
+        os.getenv("OPENAI_BASE_URL", DEFAULT_BASE_URL),
+        os.getenv("OPENAI_MODEL", DEFAULT_MODEL),
+    )
+
+
+def _build_messages(message: str, system_prompt: Optional[str] = None) -> List[Dict[str, str]]:
+    """构建单轮对话的消息列表（系统提示词 + 用户消息）"""
+    return [
+        {"role": "system", "content": system_prompt} if system_prompt else _DEFAULT_SYSTEM_MSG,
+        {"role": "user", "content": message},
+    ]
+
+
+@functools.lru_cache(maxsize=None)
+def _get_sdk_client(api_key: str, base_url: str):
+    """按 (api_key, base_url) 复用 OpenAI SDK 客户端，保留连接池和 TLS 会话"""
+    from openai import OpenAI
+
+    return OpenAI(api_key=api_key, base_url=base_url)
 
 
 class OpenAIClient:
@@ -52,84 +143,69 @@ class OpenAIClient:
     
     def __init__(self):
         """Initialize the OpenAI compatible client."""
-        self.api_key = os.getenv("OPENAI_API_KEY")
-        self.base_url = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
-        self.model = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
-        
-        if not self.api_key:
-            raise ValueError("OPENAI_API_KEY environment variable is required")
+        # 延迟加载环境变量和 openai SDK，避免 --help 等命令承担导入开销
+        self.api_key, self.base_url, self.model = resolve_config()
         
-        self.client = OpenAI(
-            api_key=self.api_key,
-            base_url=self.base_url
-        )
+        self.client = _get_sdk_client(self.api_key, self.base_url)
     
     def chat(self, message: str, system_prompt: Optional[str] = None, stream: bool = False):
         """Send a single message and get response."""
-        messages = []
-        
-        if system_prompt:
-            messages.append({"role": "system", "content": system_prompt})
-        else:
-            messages.append({"role": "system", "content": "You are a helpful assistant"})
-        
-        messages.append({"role": "user", "content": message})
+        messages = _build_messages(message, system_prompt)
         
         if stream:
             return self._chat_stream(messages)
         else:
+            from openai import OpenAIError
+
             try:
                 response = self.client.chat.completions.create(
                     model=self.model,
                     messages=messages,
                     stream=False
                 )
-                return response.choices[0].message.content
-            except Exception as e:
-                raise Exception(f"API call failed: {str(e)}")
+            except OpenAIError as e:
+                raise RuntimeError(f"API call failed: {e}") from e
+            return response.choices[0].message.content
     
     def chat_with_history(self, messages: List[Dict[str, str]], stream: bool = False):
         """Send messages with conversation history."""
         if stream:
             return self._chat_stream(messages)
         else:
+            from openai import OpenAIError
+
             try:
                 response = self.client.chat.completions.create(
                     model=self.model,
                     messages=messages,
                     stream=False
                 )
-                return response.choices[0].message.content
-            except Exception as e:
-                raise Exception(f"API call failed: {str(e)}")
+            except OpenAIError as e:
+                raise RuntimeError(f"API call failed: {e}") from e
+            return response.choices[0].message.content
     
     def _chat_stream(self, messages: List[Dict[str, str]]) -> Generator[str, None, None]:
         """Handle streaming chat completion."""
+        from openai import OpenAIError
+
+        # 只保护建立请求的部分，逐块读取时不再经过异常包装
         try:
             stream = self.client.chat.completions.create(
                 model=self.model,
                 messages=messages,
                 stream=True
             )
-            
-            for chunk in stream:
-                if chunk.choices[0].delta.content is not None:
-                    content = chunk.choices[0].delta.content
-                    yield content
-                    
-        except Exception as e:
-            raise Exception(f"API call failed: {str(e)}")
+        except OpenAIError as e:
+            raise RuntimeError(f"API call failed: {e}") from e
+        
+        for chunk in stream:
+            if chunk.choices[0].delta.content is not None:
+                content = chunk.choices[0].delta.content
+                yield content
     
     def chat_stream(self, message: str, system_prompt: Optional[str] = None) -> Generator[str, None, None]:
         """Send a single message and get streaming response."""
-        messages = []
-        
-        if system_prompt:
-            messages.append({"role": "system", "content": system_prompt})
-        else:
-            messages.append({"role": "system", "content": "You are a helpful assistant"})
-        
-        messages.append({"role": "user", "content": message})
+        messages = _build_messages(message, system_prompt)
         
         return self._chat_stream(messages)
     
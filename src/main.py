@@ -1,86 +1,163 @@
 """Main CLI module (moved to src)."""
 
 import click
+import functools
+import re
+import shutil
 import sys
 import os
-import platform
+import tempfile
+from datetime import datetime
 from pathlib import Path
+from urllib.parse import urlparse
 from rich.console import Console
 from rich.panel import Panel
 from rich.text import Text
-from rich.prompt import Prompt, Confirm
-from rich.live import Live
-from rich.markdown import Markdown
-from .client import OpenAIClient
+from typing import TYPE_CHECKING, NamedTuple
+from .client import DEFAULT_SYSTEM_PROMPT, get_config_file, read_env_file, clear_env_cache
+
+if TYPE_CHECKING:
+    from .client import OpenAIClient
 
 console = Console()
 
+
+class ConfigItem(NamedTuple):
+    """配置向导中的一个配置项"""
+    key: str
+    description: str
+    prompt: str
+    required: bool
+    default: str
+    help: str
+
+
+# 配置向导收集的配置项
+_CONFIG_ITEMS = (
+    ConfigItem(
+        key='OPENAI_API_KEY',
+        description='API 密钥',
+        prompt='OpenAI API Key',
+        required=True,
+        default='',
+        help='获取方式:\n  - OpenAI: https://platform.openai.com/api-keys\n  - 通义千问: https://dashscope.aliyuncs.com/\n  - 其他兼容服务的API密钥',
+    ),
+    ConfigItem(
+        key='OPENAI_BASE_URL',
+        description='API 基础URL',
+        prompt='API Base URL',
+        required=False,
+        default='https://api.openai.com/v1',
+        help='常用服务:\n  - OpenAI官方: https://api.openai.com/v1\n  - 通义千问: https://dashscope.aliyuncs.com/compatible-mode/v1\n  - 本地服务: http://localhost:8000/v1',
+    ),
+    ConfigItem(
+        key='OPENAI_MODEL',
+        description='模型名称',
+        prompt='Model Name',
+        required=False,
+        default='gpt-3.5-turbo',
+        help='常用模型:\n  - OpenAI: gpt-3.5-turbo, gpt-4, gpt-4-turbo\n  - 通义千问: qwen-plus, qwen-max\n  - 其他: 根据服务商文档',
+    ),
+)
+
+# 配置向导管理的环境变量名
+_ENV_KEYS = tuple(item.key for item in _CONFIG_ITEMS)
+
+# 配置向导写入的配置文件头
+_CONFIG_FILE_HEADER = """# OpenAI兼容 API 配置
+# 此文件由 chat-cli --config 命令生成
+# 配置时间: {time}
+
+"""
+
+# 显示时需要隐藏的敏感配置项
+_SENSITIVE_KEYS = frozenset({'OPENAI_API_KEY'})
+
+
+def _mask(value: str) -> str:
+    """隐藏敏感信息，只保留首尾各 4 个字符"""
+    return value[:4] + "..." + value[-4:] if len(value) > 8 else "***"
+
+
+def get_max_history_turns():
+    """获取交互模式发送给 API 的最大对话轮数，0 表示不限制"""
+    try:
+        return max(int(os.environ.get('CHAT_CLI_MAX_HISTORY', '0')), 0)
+    except ValueError:
+        return 0
+
+
+# 交互模式中的退出命令
+_EXIT_COMMANDS = frozenset({"exit", "quit", ":q", "q"})
+
+# 流式输出 Panel 的标题和样式
+_ASSISTANT_TITLE = "🤖 AI Assistant"
+_STREAM_PANEL_TITLE = "🤖 AI Assistant (流式输出)"
+_STREAM_BORDER_STYLE = "blue"
+
+# 等待首个回复块时显示的占位 Panel，只读，可在多次请求间复用
+_THINKING_PANEL = Panel(
+    Text("正在思考中...", style="dim italic"),
+    title=_ASSISTANT_TITLE,
+    border_style=_STREAM_BORDER_STYLE
+)
+_STREAM_THINKING_PANEL = Panel(
+    Text("正在思考中...", style="dim italic"),
+    title=_STREAM_PANEL_TITLE,
+    border_style=_STREAM_BORDER_STYLE
+)
+
+# 简化流式输出时累计多少字符刷新一次终端
+_STREAM_FLUSH_CHARS = 64
+
+# 支持复杂渲染的终端程序 (TERM_PROGRAM)
+_MODERN_TERMINALS = frozenset({
+    'vscode',  # VS Code 终端（包括远程开发）
+    'wezterm',
+    'alacritty',
+    'kitty',
+    'windows terminal',
+    'gnome-terminal',
+    'konsole',
+    'terminal.app',  # macOS Terminal 实际上也支持基本的复杂渲染
+})
+
+# TERM 中的现代终端特征
+_MODERN_TERM_RE = re.compile(r'(?:xterm|screen|tmux)-256color')
+
+# 已知可能有问题的终端 (TERM)
+_PROBLEMATIC_TERMS = frozenset({
+    'screen',  # 基本的 screen 环境
+    'linux',   # 基本的 Linux 控制台
+    'dumb',    # 哑终端
+})
+
+@functools.lru_cache(maxsize=None)
 def is_terminal_compatible():
-    """检测终端是否兼容复杂渲染"""
-    # 检查终端类型
-    term = os.getenv('TERM', '').lower()
-    term_program = os.getenv('TERM_PROGRAM', '').lower()
+    """检测终端是否兼容复杂渲染（进程内终端环境不变，结果只计算一次）"""
+    environ = os.environ
     
-    # VS Code 终端（包括远程开发）支持复杂渲染
-    if term_program == 'vscode':
+    # VS Code 及其他现代终端支持复杂渲染
+    if environ.get('TERM_PROGRAM', '').lower() in _MODERN_TERMINALS:
         return True
     
-    # 其他现代终端也支持复杂渲染
-    modern_terminals = [
-        'wezterm',
-        'alacritty',
-        'kitty',
-        'windows terminal',
-        'gnome-terminal',
-        'konsole',
-        'terminal.app',  # macOS Terminal 实际上也支持基本的复杂渲染
-    ]
-    
-    if term_program in modern_terminals:
-        return True
-        # 检查是否在SSH连接中
-    if os.getenv('SSH_CLIENT') or os.getenv('SSH_TTY'):
+    # 检查是否在SSH连接中
+    if environ.get('SSH_CLIENT') or environ.get('SSH_TTY'):
         return False
+    
     # 检查 TERM 环境变量中的现代终端特征
-    if any(modern_term in term for modern_term in ['xterm-256color', 'screen-256color', 'tmux-256color']):
+    term = environ.get('TERM', '').lower()
+    if _MODERN_TERM_RE.search(term):
         return True
     
-    # 已知可能有问题的终端
-    problematic_terms = [
-        'screen',  # 基本的 screen 环境
-        'linux',   # 基本的 Linux 控制台
-        'dumb',    # 哑终端
-    ]
-    
     # 检查是否在问题终端中
-    if term in problematic_terms:
+    if term in _PROBLEMATIC_TERMS:
         return False
     
     # 默认情况下，假设现代终端都支持复杂渲染
     # 除非明确检测到不支持的环境
     return True
 
-def get_config_dir():
-    """获取跨平台配置目录"""
-    if platform.system() == "Windows":
-        # Windows: 使用 APPDATA 目录
-        appdata = os.getenv('APPDATA')
-        if appdata:
-            return Path(appdata) / "chat-cli"
-        else:
-            # 回退到用户目录
-            return Path.home() / "AppData" / "Roaming" / "chat-cli"
-    elif platform.system() == "Darwin":
-        # macOS: 使用标准应用程序支持目录
-        return Path.home() / "Library" / "Application Support" / "chat-cli"
-    else:
-        # Linux/Unix: 使用 XDG 标准或 .config
-        xdg_config_home = os.getenv('XDG_CONFIG_HOME')
-        if xdg_config_home:
-            return Path(xdg_config_home) / "chat-cli"
-        else:
-            return Path.home() / ".config" / "chat-cli"
-
 @click.command()
 @click.argument('message', required=False)
 @click.option('--interactive', '-i', is_flag=True, help='启动交互模式')
@@ -118,25 +195,55 @@ def cli(message, interactive, system, show_config, disable_stream, simple_stream
 
 def run_config_command():
     """运行配置管理命令"""
+    from rich.prompt import Confirm
+
     console.print(Panel("🔧 OpenAI兼容 API 配置管理", style="bold blue"))
     
     # 先显示当前配置
-    show_current_config()
+    tested_config = show_current_config()
     
     # 询问是否要修改配置
     if Confirm.ask("\n[bold yellow]是否要修改配置?[/bold yellow]"):
-        run_config_wizard()
+        run_config_wizard(tested_config)
     else:
         console.print("[green]配置未修改[/green]")
 
 
+def _read_env_entries(env_file, source):
+    """读取 env 文件并标注每个配置项的来源，文件不存在时返回 None"""
+    try:
+        values = read_env_file(env_file)
+    except (OSError, ValueError) as e:
+        console.print(f"[red]读取{source}失败: {e}[/red]")
+        values = {}
+    if values is None:
+        return None
+    return {
+        key: {'value': value, 'source': source}
+        for key, value in values.items()
+    }
+
+
+def check_config():
+    """轻量校验当前生效的配置，不初始化 API 客户端
+
+    返回 (api_key, base_url, model)，配置无效时抛出 ValueError。
+    """
+    from .client import resolve_config
+
+    settings = resolve_config()
+    base_url = urlparse(settings[1])
+    if base_url.scheme not in ('http', 'https') or not base_url.netloc:
+        raise ValueError(f"OPENAI_BASE_URL 不是有效的 URL: {settings[1]}")
+    return settings
+
+
 def show_current_config():
-    """显示当前配置内容"""
+    """显示当前配置内容，返回测试通过的 (api_key, base_url, model)（测试失败或无配置时返回 None）"""
     console.print(Panel("📋 当前配置信息", style="bold cyan"))
     
     # 检查配置文件 - 使用跨平台配置目录
-    config_dir = get_config_dir()
-    config_file = config_dir / "env"
+    config_file = get_config_file()
     
     # 检查本地 .env 文件
     local_env_file = Path(".env")
@@ -144,167 +251,136 @@ def show_current_config():
     current_config = {}
     config_sources = []
     
-    # 读取全局配置
-    if config_file.exists():
-        config_sources.append(f"全局配置: {config_file}")
-        try:
-            with open(config_file, 'r', encoding='utf-8') as f:
-                for line in f:
-                    line = line.strip()
-                    if line and not line.startswith('#') and '=' in line:
-                        key, value = line.split('=', 1)
-                        current_config[key.strip()] = {
-                            'value': value.strip(),
-                            'source': '全局配置'
-                        }
-        except Exception as e:
-            console.print(f"[red]读取全局配置失败: {e}[/red]")
-    
-    # 读取本地配置 (会覆盖全局配置)
-    if local_env_file.exists():
-        config_sources.append(f"本地配置: {local_env_file.absolute()}")
-        try:
-            with open(local_env_file, 'r', encoding='utf-8') as f:
-                for line in f:
-                    line = line.strip()
-                    if line and not line.startswith('#') and '=' in line:
-                        key, value = line.split('=', 1)
-                        current_config[key.strip()] = {
-                            'value': value.strip(),
-                            'source': '本地配置'
-                        }
-        except Exception as e:
-            console.print(f"[red]读取本地配置失败: {e}[/red]")
+    # 先读取全局配置，再读取本地配置 (本地配置会覆盖全局配置)
+    for source, env_file, display_path in (
+        ('全局配置', config_file, config_file),
+        ('本地配置', local_env_file, local_env_file.absolute()),
+    ):
+        entries = _read_env_entries(env_file, source)
+        if entries is None:
+            # 文件不存在
+            continue
+        config_sources.append(f"{source}: {display_path}")
+        current_config.update(entries)
     
     # 检查环境变量 (会覆盖文件配置)
-    env_vars = ['OPENAI_API_KEY', 'OPENAI_BASE_URL', 'OPENAI_MODEL']
-    for var in env_vars:
-        env_value = os.getenv(var)
-        if env_value:
-            if var not in current_config or current_config[var]['value'] != env_value:
-                current_config[var] = {
-                    'value': env_value,
-                    'source': '环境变量'
-                }
+    environ = os.environ
+    for var in _ENV_KEYS:
+        env_value = environ.get(var)
+        if env_value and current_config.get(var, {}).get('value') != env_value:
+            current_config[var] = {
+                'value': env_value,
+                'source': '环境变量'
+            }
+    
+    # 配置来源和配置项汇总后一次性输出
+    lines = []
     
     # 显示配置来源
     if config_sources:
-        console.print("[bold green]配置文件:[/bold green]")
+        lines.append("[bold green]配置文件:[/bold green]")
         for source in config_sources:
-            console.print(f"  • {source}")
-        console.print()
+            lines.append(f"  • {source}")
+        lines.append("")
     
     # 显示配置内容
     if current_config:
-        console.print("[bold green]配置项:[/bold green]")
-        
-        config_items = [
-            ('OPENAI_API_KEY', 'API 密钥', True),
-            ('OPENAI_BASE_URL', 'API 基础URL', False),
-            ('OPENAI_MODEL', '模型名称', False)
-        ]
+        lines.append("[bold green]配置项:[/bold green]")
         
-        for key, description, is_sensitive in config_items:
-            if key in current_config:
-                value = current_config[key]['value']
-                source = current_config[key]['source']
+        for item in _CONFIG_ITEMS:
+            if item.key in current_config:
+                value = current_config[item.key]['value']
+                source = current_config[item.key]['source']
                 
-                if is_sensitive and value:
+                if item.key in _SENSITIVE_KEYS and value:
                     # 隐藏敏感信息
-                    display_value = value[:4] + "..." + value[-4:] if len(value) > 8 else "***"
+                    display_value = _mask(value)
                 else:
                     display_value = value
                 
-                console.print(f"  • [bold cyan]{description}[/bold cyan]: {display_value}")
-                console.print(f"    [dim]来源: {source}[/dim]")
+                lines.append(f"  • [bold cyan]{item.description}[/bold cyan]: {display_value}")
+                lines.append(f"    [dim]来源: {source}[/dim]")
             else:
-                console.print(f"  • [bold cyan]{description}[/bold cyan]: [red]未设置[/red]")
+                lines.append(f"  • [bold cyan]{item.description}[/bold cyan]: [red]未设置[/red]")
         
-        console.print()
+        lines.append("")
+        console.print("\n".join(lines))
         
-        # 测试当前配置
-        console.print("[bold cyan]🧪 配置测试:[/bold cyan]")
+        # 测试当前配置，标题和结果一起输出
         try:
-            # 重新加载环境变量
-            from .client import load_env_files
-            load_env_files()
-            
-            # 尝试初始化客户端
-            client = OpenAIClient()
-            console.print("  [bold green]✅ 配置有效，可以正常使用[/bold green]")
-        except Exception as e:
-            console.print(f"  [red]❌ 配置测试失败: {e}[/red]")
-            console.print("  [yellow]建议修改配置以修复问题[/yellow]")
+            settings = check_config()
+            console.print(
+                "[bold cyan]🧪 配置测试:[/bold cyan]\n"
+                "  [bold green]✅ 配置有效，可以正常使用[/bold green]"
+            )
+            return settings
+        except (OSError, ValueError) as e:
+            console.print(
+                "[bold cyan]🧪 配置测试:[/bold cyan]\n"
+                f"  [red]❌ 配置测试失败: {e}[/red]\n"
+                "  [yellow]建议修改配置以修复问题[/yellow]"
+            )
     else:
-        console.print("[yellow]未找到任何配置信息[/yellow]")
-        console.print("需要进行初始配置")
+        lines.append("[yellow]未找到任何配置信息[/yellow]")
+        lines.append("需要进行初始配置")
+        console.print("\n".join(lines))
+    return None
 
 
-def run_config_wizard():
-    """运行配置向导"""
+def _refresh_saved_env(old_config, new_config):
+    """把刚保存的全局配置同步到环境变量
+
+    全局配置以 override=False 加载，进程内早先从旧配置文件载入的值不会被覆盖。
+    仍等于旧文件值的配置项直接改为新值，真实环境变量保持不变，
+    随后重新加载 env 文件，本地 .env 仍然优先。
+    """
+    environ = os.environ
+    for key, value in new_config.items():
+        if key in old_config and environ.get(key) == old_config[key]:
+            environ[key] = value
+    clear_env_cache()
+
+
+def run_config_wizard(tested_config=None):
+    """运行配置向导
+
+    tested_config 为 show_current_config 中已测试通过的
+    (api_key, base_url, model)，新配置与其一致时跳过重复测试。
+    """
+    from rich.prompt import Prompt, Confirm
+
     console.print(Panel("🔧 配置向导", style="bold blue"))
     
     # 检查现有配置 - 使用跨平台配置目录
-    config_dir = get_config_dir()
-    config_file = config_dir / "env"
+    config_file = get_config_file()
     
     current_config = {}
-    if config_file.exists():
-        try:
-            with open(config_file, 'r', encoding='utf-8') as f:
-                for line in f:
-                    line = line.strip()
-                    if line and not line.startswith('#') and '=' in line:
-                        key, value = line.split('=', 1)
-                        current_config[key.strip()] = value.strip()
-        except Exception as e:
-            console.print(f"[red]读取现有配置失败: {e}[/red]")
+    try:
+        current_config = read_env_file(config_file) or {}
+    except (OSError, ValueError) as e:
+        console.print(f"[red]读取现有配置失败: {e}[/red]")
     
     # 交互式收集配置信息
-    config_items = [
-        {
-            'key': 'OPENAI_API_KEY',
-            'prompt': 'OpenAI API Key',
-            'required': True,
-            'help': '获取方式:\n  - OpenAI: https://platform.openai.com/api-keys\n  - 通义千问: https://dashscope.aliyuncs.com/\n  - 其他兼容服务的API密钥'
-        },
-        {
-            'key': 'OPENAI_BASE_URL',
-            'prompt': 'API Base URL',
-            'default': 'https://api.openai.com/v1',
-            'required': False,
-            'help': '常用服务:\n  - OpenAI官方: https://api.openai.com/v1\n  - 通义千问: https://dashscope.aliyuncs.com/compatible-mode/v1\n  - 本地服务: http://localhost:8000/v1'
-        },
-        {
-            'key': 'OPENAI_MODEL',
-            'prompt': 'Model Name',
-            'default': 'gpt-3.5-turbo',
-            'required': False,
-            'help': '常用模型:\n  - OpenAI: gpt-3.5-turbo, gpt-4, gpt-4-turbo\n  - 通义千问: qwen-plus, qwen-max\n  - 其他: 根据服务商文档'
-        }
-    ]
-    
     new_config = {}
     
-    for item in config_items:
-        key = item['key']
-        prompt_text = item['prompt']
+    for item in _CONFIG_ITEMS:
+        key = item.key
+        prompt_text = item.prompt
         current_value = current_config.get(key, '')
-        default_value = item.get('default', '')
+        default_value = item.default
         
         # 构建提示信息
         if current_value:
-            if 'API_KEY' in key:
+            if key in _SENSITIVE_KEYS:
                 # 隐藏API Key显示
-                display_value = current_value[:4] + "..." + current_value[-4:] if len(current_value) > 8 else current_value
-                prompt_text += f" (当前: {display_value})"
+                prompt_text += f" (当前: {_mask(current_value)})"
             else:
                 prompt_text += f" (当前: {current_value})"
         elif default_value:
             prompt_text += f" (默认: {default_value})"
         
-        if item.get('help'):
-            console.print(f"[dim]{item['help']}[/dim]")
+        if item.help:
+            console.print(f"[dim]{item.help}[/dim]")
         
         # 获取用户输入
         while True:
@@ -318,7 +394,7 @@ def run_config_wizard():
                     # 没有现有值时
                     value = Prompt.ask(f"[bold cyan]{prompt_text}[/bold cyan]", default=default_value)
                 
-                if item['required'] and not value:
+                if item.required and not value:
                     console.print("[red]此配置项为必填项，请提供有效值[/red]")
                     continue
                 
@@ -329,14 +405,13 @@ def run_config_wizard():
                 sys.exit(0)
     
     # 显示配置总结
-    console.print("\n" + "="*50)
-    console.print("[bold green]配置总结:[/bold green]")
+    summary = ["\n" + "="*50, "[bold green]配置总结:[/bold green]"]
     for key, value in new_config.items():
-        if 'API_KEY' in key:
-            display_value = value[:4] + "..." + value[-4:] if len(value) > 8 else value
-            console.print(f"  {key}: {display_value}")
+        if key in _SENSITIVE_KEYS:
+            summary.append(f"  {key}: {_mask(value)}")
         else:
-            console.print(f"  {key}: {value}")
+            summary.append(f"  {key}: {value}")
+    console.print("\n".join(summary))
     
     # 确认保存
     if not Confirm.ask("\n[bold yellow]确认保存配置?[/bold yellow]"):
@@ -344,55 +419,113 @@ def run_config_wizard():
         return
     
     # 创建配置目录
-    config_dir.mkdir(parents=True, exist_ok=True)
+    config_file.parent.mkdir(parents=True, exist_ok=True)
     
     # 写入配置文件
     try:
-        config_content = f"""# OpenAI兼容 API 配置
-# 此文件由 chat-cli --config 命令生成
-# 配置时间: {__import__('datetime').datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-
-OPENAI_API_KEY={new_config['OPENAI_API_KEY']}
-OPENAI_BASE_URL={new_config['OPENAI_BASE_URL']}
-OPENAI_MODEL={new_config['OPENAI_MODEL']}
-"""
+        config_content = _CONFIG_FILE_HEADER.format(
+            time=datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        ) + "".join(f"{key}={new_config[key]}\n" for key in _ENV_KEYS)
+        
+        # 先写临时文件再替换，避免写入中断时留下不完整的配置文件
+        # mkstemp 创建的文件权限为 0600，已有配置文件时沿用其权限
+        # 配置文件是符号链接时替换链接指向的文件，保留链接本身
+        target = config_file.resolve()
+        fd, tmp_name = tempfile.mkstemp(dir=target.parent, prefix='.env-', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(config_content)
+            if target.exists():
+                shutil.copymode(target, tmp_name)
+            os.replace(tmp_name, target)
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+        _refresh_saved_env(current_config, new_config)
         
-        with open(config_file, 'w', encoding='utf-8') as f:
-            f.write(config_content)
+        console.print(
+            f"[bold green]✅ 配置已保存到: {config_file}[/bold green]\n"
+            "[dim]提示: 现在您可以使用 chat-cli 开始聊天了！[/dim]"
+        )
         
-        console.print(f"[bold green]✅ 配置已保存到: {config_file}[/bold green]")
-        console.print("[dim]提示: 现在您可以使用 chat-cli 开始聊天了！[/dim]")
+        # 配置与刚测试通过的一致时无需再次测试
+        if tested_config is not None and tested_config == (
+            new_config['OPENAI_API_KEY'],
+            new_config['OPENAI_BASE_URL'],
+            new_config['OPENAI_MODEL'],
+        ):
+            console.print("[bold green]✅ 配置未变化，已通过测试[/bold green]")
+            return
         
         # 测试配置
-        console.print("\n[bold cyan]🧪 测试配置...[/bold cyan]")
         try:
-            # 重新加载环境变量
-            from .client import load_env_files
-            load_env_files()
-            
-            # 尝试初始化客户端
-            client = OpenAIClient()
-            console.print("[bold green]✅ 配置测试成功！[/bold green]")
-        except Exception as e:
-            console.print(f"[red]❌ 配置测试失败: {e}[/red]")
-            console.print("[yellow]请检查API Key和Base URL是否正确[/yellow]")
+            check_config()
+            console.print(
+                "\n[bold cyan]🧪 测试配置...[/bold cyan]\n"
+                "[bold green]✅ 配置测试成功！[/bold green]"
+            )
+        except (OSError, ValueError) as e:
+            console.print(
+                "\n[bold cyan]🧪 测试配置...[/bold cyan]\n"
+                f"[red]❌ 配置测试失败: {e}[/red]\n"
+                "[yellow]请检查API Key和Base URL是否正确[/yellow]"
+            )
     
     except Exception as e:
         console.print(f"[red]保存配置失败: {e}[/red]")
         sys.exit(1)
 
 
+def _write_stream(chunks):
+    """把流式回复直接写到终端，遇到换行或积累足够内容时才刷新，返回完整回复"""
+    out = console.file
+    parts = []
+    pending = 0
+    for chunk in chunks:
+        parts.append(chunk)
+        out.write(chunk)
+        pending += len(chunk)
+        if pending >= _STREAM_FLUSH_CHARS or "\n" in chunk:
+            out.flush()
+            pending = 0
+    out.flush()
+    return "".join(parts)
+
+
+def _stream_into_panel(chunks, thinking_panel, title):
+    """在Rich Panel中实时显示流式回复，返回完整回复"""
+    from rich.live import Live
+    
+    # 回复内容追加到同一个Text中，由Live定时刷新，不必每块重建Panel
+    response_text = Text(style="bold")
+    
+    # 降低刷新频率，提高稳定性
+    with Live(thinking_panel, console=console, refresh_per_second=4) as live:
+        for chunk in chunks:
+            if not response_text:
+                live.update(Panel(
+                    response_text,
+                    title=title,
+                    border_style=_STREAM_BORDER_STYLE
+                ))
+            response_text.append(chunk)
+    
+    return response_text.plain
+
+
 def run_chat_command(message, interactive, system, stream=False, simple_stream=False):
     """执行聊天命令的核心逻辑"""
+    from .client import OpenAIClient
+
     try:
         client = OpenAIClient()
     except ValueError as e:
-        console.print(f"[red]错误: {e}[/red]")
-        console.print("[yellow]请设置 OPENAI_API_KEY 环境变量[/yellow]")
-        console.print("请使用 'chat-cli --config' 命令进行配置")
+        click.secho(f"错误: {e}", fg="red", err=True)
+        click.secho("请设置 OPENAI_API_KEY 环境变量", fg="yellow", err=True)
+        click.echo("请使用 'chat-cli --config' 命令进行配置", err=True)
         sys.exit(1)
     except Exception as e:
-        console.print(f"[red]初始化失败: {e}[/red]")
+        click.secho(f"初始化失败: {e}", fg="red", err=True)
         sys.exit(1)
     
     if interactive:
@@ -400,11 +533,10 @@ def run_chat_command(message, interactive, system, stream=False, simple_stream=F
     elif message:
         run_single_message(client, message, system, stream, simple_stream)
     else:
-        console.print("请提供消息或使用 --interactive 模式")
-        console.print("使用 --help 查看帮助信息")
+        console.print("请提供消息或使用 --interactive 模式\n使用 --help 查看帮助信息")
 
 
-def run_single_message(client: OpenAIClient, message: str, system_prompt: str = None, stream: bool = False, simple_stream: bool = False):
+def run_single_message(client: "OpenAIClient", message: str, system_prompt: str = None, stream: bool = False, simple_stream: bool = False):
     """运行单次问答模式"""
     if stream:
         # 检查是否使用简化流式输出
@@ -420,12 +552,9 @@ def run_single_message(client: OpenAIClient, message: str, system_prompt: str =
             console.print("[bold blue]🤖 AI Assistant:[/bold blue]")
             console.print()
             
-            full_response = ""
             try:
-                for chunk in client.chat_stream(message, system_prompt):
-                    full_response += chunk
-                    # 直接输出字符，不使用Panel
-                    console.print(chunk, end="", highlight=False)
+                # 直接输出字符，不使用Panel
+                _write_stream(client.chat_stream(message, system_prompt))
                 
                 console.print()  # 换行
                 console.print()  # 空行
@@ -434,26 +563,13 @@ def run_single_message(client: OpenAIClient, message: str, system_prompt: str =
                 console.print(f"[red]API调用失败: {e}[/red]")
         else:
             # 使用Rich Panel的流式输出（优化版本）
-            full_response = ""
             try:
-                # 创建一个初始的Panel
-                panel = Panel(
-                    Text("正在思考中...", style="dim italic"),
-                    title="🤖 AI Assistant (流式输出)",
-                    border_style="blue"
+                _stream_into_panel(
+                    client.chat_stream(message, system_prompt),
+                    _STREAM_THINKING_PANEL,
+                    _STREAM_PANEL_TITLE,
                 )
                 
-                # 降低刷新频率，提高稳定性
-                with Live(panel, console=console, refresh_per_second=4) as live:
-                    for chunk in client.chat_stream(message, system_prompt):
-                        full_response += chunk
-                        # 实时更新Panel内容
-                        live.update(Panel(
-                            Text(full_response, style="bold"),
-                            title="🤖 AI Assistant (流式输出)",
-                            border_style="blue"
-                        ))
-                
                 console.print()  # 添加一个空行
                 
             except Exception as e:
@@ -461,12 +577,14 @@ def run_single_message(client: OpenAIClient, message: str, system_prompt: str =
     else:
         try:
             response = client.chat(message, system_prompt)
-            console.print(Panel(Text(response, style="bold"), title="🤖 AI Assistant"))
+            console.print(Panel(Text(response, style="bold"), title=_ASSISTANT_TITLE))
         except Exception as e:
             console.print(f"[red]API调用失败: {e}[/red]")
 
-def run_interactive_mode(client: OpenAIClient, system_prompt: str = None, stream: bool = False, simple_stream: bool = False):
+def run_interactive_mode(client: "OpenAIClient", system_prompt: str = None, stream: bool = False, simple_stream: bool = False):
     """运行交互模式"""
+    from rich.prompt import Prompt
+
     # 检查是否使用简化流式输出
     # 如果用户明确指定了 --simple-stream，则强制使用简化模式
     # 否则根据终端兼容性自动判断
@@ -477,24 +595,24 @@ def run_interactive_mode(client: OpenAIClient, system_prompt: str = None, stream
     
     if stream:
         if use_simple:
-            console.print(Panel("进入交互模式（简化流式输出），输入 'exit' 退出。", title="🤖 AI Assistant"))
+            console.print(Panel("进入交互模式（简化流式输出），输入 'exit' 退出。", title=_ASSISTANT_TITLE))
         else:
-            console.print(Panel("进入交互模式（流式输出），输入 'exit' 退出。", title="🤖 AI Assistant"))
+            console.print(Panel("进入交互模式（流式输出），输入 'exit' 退出。", title=_ASSISTANT_TITLE))
     else:
-        console.print(Panel("进入交互模式，输入 'exit' 退出。", title="🤖 AI Assistant"))
+        console.print(Panel("进入交互模式，输入 'exit' 退出。", title=_ASSISTANT_TITLE))
     
-    history = []
-    if system_prompt:
-        history.append({"role": "system", "content": system_prompt})
-    else:
-        history.append({"role": "system", "content": "You are a helpful assistant"})
+    max_turns = get_max_history_turns()
+    history = [{"role": "system", "content": system_prompt or DEFAULT_SYSTEM_PROMPT}]
     
     while True:
         user_input = Prompt.ask("[bold green]你[/bold green]")
-        if user_input.strip().lower() in ["exit", "quit", ":q", "q"]:
+        if user_input.strip().lower() in _EXIT_COMMANDS:
             console.print("[yellow]已退出交互模式[/yellow]")
             break
         history.append({"role": "user", "content": user_input})
+        if max_turns:
+            # 保留系统提示词和最近 max_turns 轮对话，限制每次请求的体积
+            del history[1:-(2 * max_turns - 1)]
         
         try:
             if stream:
@@ -503,40 +621,24 @@ def run_interactive_mode(client: OpenAIClient, system_prompt: str = None, stream
                     console.print("[bold blue]🤖 AI Assistant:[/bold blue]")
                     console.print()
                     
-                    full_response = ""
-                    for chunk in client.chat_with_history_stream(history):
-                        full_response += chunk
-                        console.print(chunk, end="", highlight=False)
+                    full_response = _write_stream(client.chat_with_history_stream(history))
                     
                     console.print()  # 换行
                     console.print()  # 空行
                     history.append({"role": "assistant", "content": full_response})
                 else:
                     # 使用Rich Panel的流式输出（优化版本）
-                    full_response = ""
-                    # 创建初始Panel
-                    panel = Panel(
-                        Text("正在思考中...", style="dim italic"),
-                        title="🤖 AI Assistant",
-                        border_style="blue"
+                    full_response = _stream_into_panel(
+                        client.chat_with_history_stream(history),
+                        _THINKING_PANEL,
+                        _ASSISTANT_TITLE,
                     )
                     
-                    # 降低刷新频率
-                    with Live(panel, console=console, refresh_per_second=4) as live:
-                        for chunk in client.chat_with_history_stream(history):
-                            full_response += chunk
-                            # 实时更新Panel内容
-                            live.update(Panel(
-                                Text(full_response, style="bold"),
-                                title="🤖 AI Assistant",
-                                border_style="blue"
-                            ))
-                    
                     console.print()  # 添加空行
                     history.append({"role": "assistant", "content": full_response})
             else:
                 response = client.chat_with_history(history)
                 history.append({"role": "assistant", "content": response})
-                console.print(Panel(Text(response, style="bold"), title="🤖 AI Assistant"))
+                console.print(Panel(Text(response, style="bold"), title=_ASSISTANT_TITLE))
         except Exception as e:
             console.print(f"[red]API调用失败: {e}[/red]")
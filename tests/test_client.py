@@ -5,7 +5,24 @@ import os
 import tempfile
 from pathlib import Path
 from unittest.mock import Mock, patch
-from src.client import OpenAIClient, load_env_files
+from src.client import (
+    OpenAIClient, load_env_files, get_config_dir, get_config_file,
+    read_env_file, clear_env_cache, _get_sdk_client, _parse_env_file,
+)
+
+
+@pytest.fixture(autouse=True)
+def clear_config_cache():
+    """Reset cached config paths and SDK clients so each test sees its own environment."""
+    get_config_file.cache_clear()
+    get_config_dir.cache_clear()
+    _get_sdk_client.cache_clear()
+    clear_env_cache()
+    yield
+    get_config_file.cache_clear()
+    get_config_dir.cache_clear()
+    _get_sdk_client.cache_clear()
+    clear_env_cache()
 
 
 class TestEnvLoading:
@@ -25,6 +42,40 @@ class TestEnvLoading:
                     load_env_files()
                     assert os.getenv('TEST_VAR') == 'global_value'
     
+    def test_load_env_files_skips_missing_local_env(self):
+        """Test no local .env lookup happens when cwd has none."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            with patch('src.client.Path.home', return_value=Path(temp_dir)), \
+                    patch('src.client.Path.cwd', return_value=Path(temp_dir)):
+                with patch('dotenv.load_dotenv') as mock_load_dotenv:
+                    with patch.dict(os.environ, {}, clear=True):
+                        load_env_files()
+                    mock_load_dotenv.assert_not_called()
+    
+    def test_load_env_files_runs_once(self):
+        """Test env files are loaded once until the cache is cleared."""
+        with patch('src.client._load_env_file') as mock_load_env_file:
+            load_env_files()
+            load_env_files()
+            assert mock_load_env_file.call_count == 2  # global + local
+            
+            clear_env_cache()
+            load_env_files()
+            assert mock_load_env_file.call_count == 4
+    
+    def test_config_dir_is_cached(self):
+        """Test the config dir is resolved once per process."""
+        with patch.dict(os.environ, {'XDG_CONFIG_HOME': '/tmp/xdg'}):
+            first = get_config_dir()
+        assert get_config_dir() is first
+        assert get_config_file() == first / "env"
+    
+    def test_config_dir_macos(self):
+        """Test the macOS config dir is chosen from sys.platform."""
+        with patch('src.client.sys.platform', 'darwin'):
+            with patch('src.client.Path.home', return_value=Path('/Users/test')):
+                assert get_config_dir() == Path('/Users/test/Library/Application Support/chat-cli')
+    
     def test_load_env_files_priority(self):
         """Test that local .env overrides global config."""
         with tempfile.TemporaryDirectory() as temp_dir:
@@ -38,29 +89,68 @@ class TestEnvLoading:
             local_env_file = Path(temp_dir) / ".env"
             local_env_file.write_text("TEST_VAR=local_value\n")
             
-            with patch('src.client.Path.home', return_value=Path(temp_dir)):
-                with patch('src.client.load_dotenv') as mock_load_dotenv:
-                    def mock_load_side_effect(path=None, override=False):
-                        if path and path.name == "env":
-                            os.environ['TEST_VAR'] = 'global_value'
-                            os.environ['GLOBAL_ONLY'] = 'global_only'
-                        elif not path:  # local .env
-                            if override:
-                                os.environ['TEST_VAR'] = 'local_value'
-                    
-                    mock_load_dotenv.side_effect = mock_load_side_effect
-                    
-                    with patch.dict(os.environ, {}, clear=True):
-                        load_env_files()
-                        assert os.getenv('TEST_VAR') == 'local_value'  # local overrides
-                        assert os.getenv('GLOBAL_ONLY') == 'global_only'  # global preserved
+            with patch('src.client.Path.home', return_value=Path(temp_dir)), \
+                    patch('src.client.Path.cwd', return_value=Path(temp_dir)):
+                with patch.dict(os.environ, {}, clear=True):
+                    load_env_files()
+                    assert os.getenv('TEST_VAR') == 'local_value'  # local overrides
+                    assert os.getenv('GLOBAL_ONLY') == 'global_only'  # global preserved
+    
+    def test_read_env_file_cached_until_modified(self, tmp_path):
+        """Test env files are parsed once and re-read after modification."""
+        env_file = tmp_path / "env"
+        env_file.write_text("OPENAI_MODEL=gpt-4\nEMPTY\n")
+        
+        assert read_env_file(env_file) == {'OPENAI_MODEL': 'gpt-4'}
+        assert read_env_file(env_file) == {'OPENAI_MODEL': 'gpt-4'}
+        assert _parse_env_file.cache_info().hits == 1
+        
+        env_file.write_text("OPENAI_MODEL=qwen-plus\n")
+        os.utime(env_file, ns=(1, 1))
+        assert read_env_file(env_file) == {'OPENAI_MODEL': 'qwen-plus'}
+    
+    def test_read_env_file_rewrite_with_same_mtime(self, tmp_path, monkeypatch):
+        """Test a rewrite within one timestamp tick is not served from the cache."""
+        env_file = tmp_path / "env"
+        env_file.write_text("OPENAI_MODEL=gpt-4\n")
+        os.utime(env_file, ns=(1, 1))
+        assert read_env_file(env_file) == {'OPENAI_MODEL': 'gpt-4'}
+        
+        env_file.write_text("OPENAI_MODEL=qwen-plus\n")
+        os.utime(env_file, ns=(1, 1))
+        assert read_env_file(env_file) == {'OPENAI_MODEL': 'qwen-plus'}
+        
+        # 相对路径与绝对路径共用同一缓存项
+        monkeypatch.chdir(tmp_path)
+        assert read_env_file("env") == {'OPENAI_MODEL': 'qwen-plus'}
+        assert _parse_env_file.cache_info().misses == 2
+    
+    def test_read_env_file_missing(self, tmp_path):
+        """Test a missing env file reads as None and an empty one is not parsed."""
+        assert read_env_file(tmp_path / "missing") is None
+        
+        empty_file = tmp_path / "empty"
+        empty_file.write_text("")
+        assert read_env_file(empty_file) == {}
+        assert _parse_env_file.cache_info().misses == 0
+    
+    def test_env_directory_treated_as_missing(self, tmp_path):
+        """Test a .env directory is skipped instead of raising IsADirectoryError."""
+        (tmp_path / ".env").mkdir()
+        
+        assert read_env_file(tmp_path / ".env") is None
+        with patch('src.client.Path.home', return_value=tmp_path), \
+                patch('src.client.Path.cwd', return_value=tmp_path):
+            with patch.dict(os.environ, {'OPENAI_API_KEY': 'test-key'}, clear=True):
+                load_env_files()
+                assert os.getenv('OPENAI_API_KEY') == 'test-key'
 
 
 class TestOpenAIClient:
     """Test OpenAI client functionality."""
     
     @patch.dict('os.environ', {'OPENAI_API_KEY': 'test-key'}, clear=True)
-    @patch('src.client.OpenAI')
+    @patch('openai.OpenAI')
     def test_client_initialization(self, mock_openai):
         """Test client initialization."""
         client = OpenAIClient()
@@ -69,6 +159,15 @@ class TestOpenAIClient:
         assert client.model == 'gpt-3.5-turbo'
         mock_openai.assert_called_once()
     
+    @patch.dict('os.environ', {'OPENAI_API_KEY': 'test-key'}, clear=True)
+    @patch('openai.OpenAI')
+    def test_sdk_client_reused(self, mock_openai):
+        """Test the SDK client is shared between clients with the same settings."""
+        first = OpenAIClient()
+        second = OpenAIClient()
+        assert first.client is second.client
+        mock_openai.assert_called_once_with(api_key='test-key', base_url='https://api.openai.com/v1')
+    
     def test_client_initialization_without_api_key(self):
         """Test client initialization without API key."""
         with patch.dict('os.environ', {}, clear=True):
@@ -76,7 +175,7 @@ class TestOpenAIClient:
                 OpenAIClient()
     
     @patch.dict('os.environ', {'OPENAI_API_KEY': 'test-key'}, clear=True)
-    @patch('src.client.OpenAI')
+    @patch('openai.OpenAI')
     def test_chat_success(self, mock_openai):
         """Test successful chat."""
         # Mock the OpenAI client response
@@ -95,7 +194,7 @@ class TestOpenAIClient:
         mock_client_instance.chat.completions.create.assert_called_once()
     
     @patch.dict('os.environ', {'OPENAI_API_KEY': 'test-key'}, clear=True)
-    @patch('src.client.OpenAI')
+    @patch('openai.OpenAI')
     def test_chat_with_system_prompt(self, mock_openai):
         """Test chat with custom system prompt."""
         mock_response = Mock()
@@ -114,3 +213,39 @@ class TestOpenAIClient:
         messages = call_args.kwargs['messages']
         assert messages[0]['role'] == 'system'
         assert messages[0]['content'] == 'You are a test assistant'
+    
+    @patch.dict('os.environ', {'OPENAI_API_KEY': 'test-key'}, clear=True)
+    @patch('openai.OpenAI')
+    def test_chat_default_system_prompt(self, mock_openai):
+        """Test chat falls back to the default system prompt."""
+        mock_response = Mock()
+        mock_response.choices = [Mock()]
+        
+        mock_client_instance = Mock()
+        mock_client_instance.chat.completions.create.return_value = mock_response
+        mock_openai.return_value = mock_client_instance
+        
+        client = OpenAIClient()
+        client.chat("Hello")
+        
+        messages = mock_client_instance.chat.completions.create.call_args.kwargs['messages']
+        assert messages == [
+            {"role": "system", "content": "You are a helpful assistant"},
+            {"role": "user", "content": "Hello"},
+        ]
+    
+    @patch.dict('os.environ', {'OPENAI_API_KEY': 'test-key'}, clear=True)
+    @patch('openai.OpenAI')
+    def test_chat_api_error(self, mock_openai):
+        """Test SDK errors are re-raised as RuntimeError with the cause chained."""
+        import openai
+        
+        error = openai.OpenAIError("boom")
+        mock_client_instance = Mock()
+        mock_client_instance.chat.completions.create.side_effect = error
+        mock_openai.return_value = mock_client_instance
+        
+        client = OpenAIClient()
+        with pytest.raises(RuntimeError, match="API call failed: boom") as exc_info:
+            list(client.chat_stream("Hello"))
+        assert exc_info.value.__cause__ is error
@@ -1,9 +1,30 @@
 """Test main CLI functionality."""
 
+import os
 import pytest
 from click.testing import CliRunner
 from unittest.mock import Mock, patch
-from src.main import cli
+from src.client import clear_env_cache
+from src.main import cli, check_config
+
+
+@pytest.fixture(autouse=True)
+def reset_env_cache():
+    """Make every test reload env files."""
+    clear_env_cache()
+    yield
+    clear_env_cache()
+
+
+@pytest.fixture
+def isolated_config(tmp_path, monkeypatch):
+    """Run in tmp_path with an empty environment and tmp_path/env as the global config file."""
+    config_file = tmp_path / "env"
+    monkeypatch.chdir(tmp_path)
+    with patch.dict('os.environ', {}, clear=True), \
+            patch('src.main.get_config_file', return_value=config_file), \
+            patch('src.client.get_config_file', return_value=config_file):
+        yield config_file
 
 
 class TestCLI:
@@ -13,30 +34,69 @@ class TestCLI:
         """Set up test fixtures."""
         self.runner = CliRunner()
     
-    @patch('src.main.OpenAIClient')
+    @patch('src.client.OpenAIClient')
     def test_cli_single_message(self, mock_client_class):
         """Test CLI with single message."""
         # Mock the client
         mock_client = Mock()
-        mock_client.chat.return_value = "Test response"
+        mock_client.chat_stream.return_value = iter(["Test ", "response"])
         mock_client_class.return_value = mock_client
         
         result = self.runner.invoke(cli, ['Hello'])
         
+        assert result.exit_code == 0
+        mock_client.chat_stream.assert_called_once_with('Hello', None)
+        mock_client.chat.assert_not_called()
+    
+    @patch('src.client.OpenAIClient')
+    def test_cli_single_message_simple_stream(self, mock_client_class):
+        """Test simple streaming writes the chunks verbatim."""
+        mock_client = Mock()
+        mock_client.chat_stream.return_value = iter(["Hello ", "[bold]", "world\n", "!"])
+        mock_client_class.return_value = mock_client
+        
+        result = self.runner.invoke(cli, ['--simple-stream', 'Hi'])
+        
+        assert result.exit_code == 0
+        assert "Hello [bold]world\n!" in result.output
+    
+    @patch('src.main.is_terminal_compatible', return_value=True)
+    @patch('src.client.OpenAIClient')
+    def test_cli_single_message_panel_stream(self, mock_client_class, mock_compatible):
+        """Test panel streaming renders the whole response."""
+        mock_client = Mock()
+        mock_client.chat_stream.return_value = iter(["Hel", "lo ", "world"])
+        mock_client_class.return_value = mock_client
+        
+        result = self.runner.invoke(cli, ['Hi'])
+        
+        assert result.exit_code == 0
+        assert "Hello world" in result.output
+        assert "正在思考中" not in result.output
+    
+    @patch('src.client.OpenAIClient')
+    def test_cli_single_message_disable_stream(self, mock_client_class):
+        """Test CLI with streaming disabled."""
+        mock_client = Mock()
+        mock_client.chat.return_value = "Test response"
+        mock_client_class.return_value = mock_client
+        
+        result = self.runner.invoke(cli, ['--disable-stream', 'Hello'])
+        
         assert result.exit_code == 0
         mock_client.chat.assert_called_once_with('Hello', None)
     
-    @patch('src.main.OpenAIClient')
+    @patch('src.client.OpenAIClient')
     def test_cli_with_system_prompt(self, mock_client_class):
         """Test CLI with system prompt."""
         mock_client = Mock()
-        mock_client.chat.return_value = "Test response"
+        mock_client.chat_stream.return_value = iter(["Test response"])
         mock_client_class.return_value = mock_client
         
         result = self.runner.invoke(cli, ['--system', 'You are helpful', 'Hello'])
         
         assert result.exit_code == 0
-        mock_client.chat.assert_called_once_with('Hello', 'You are helpful')
+        mock_client.chat_stream.assert_called_once_with('Hello', 'You are helpful')
     
     def test_cli_no_arguments(self):
         """Test CLI without arguments."""
@@ -45,7 +105,7 @@ class TestCLI:
         assert result.exit_code == 0
         assert "请提供消息或使用 --interactive 模式" in result.output
     
-    @patch('src.main.OpenAIClient')
+    @patch('src.client.OpenAIClient')
     def test_cli_api_key_missing(self, mock_client_class):
         """Test CLI when API key is missing."""
         mock_client_class.side_effect = ValueError("OPENAI_API_KEY environment variable is required")
@@ -54,3 +114,219 @@ class TestCLI:
         
         assert result.exit_code == 1
         assert "请设置 OPENAI_API_KEY 环境变量" in result.output
+    
+    @patch('src.client.OpenAIClient')
+    def test_cli_config_reads_quoted_values(self, mock_client_class, isolated_config):
+        """Test --config shows values parsed from the global env file."""
+        isolated_config.write_text('# comment\nexport OPENAI_MODEL="qwen-plus"\n', encoding='utf-8')
+        
+        result = self.runner.invoke(cli, ['--config'], input='n\n')
+        
+        assert result.exit_code == 0
+        assert "qwen-plus" in result.output
+        assert '"qwen-plus"' not in result.output
+    
+    @patch('src.client.OpenAIClient')
+    def test_cli_config_wizard_cancel(self, mock_client_class, isolated_config):
+        """Test the config wizard walks every item and can be cancelled."""
+        result = self.runner.invoke(cli, ['--config'], input='y\nsk-test-key-1234\n\n\nn\n')
+        
+        assert result.exit_code == 0
+        assert "OpenAI API Key" in result.output
+        assert "OPENAI_BASE_URL: https://api.openai.com/v1" in result.output
+        assert "OPENAI_MODEL: gpt-3.5-turbo" in result.output
+        assert "OPENAI_API_KEY: sk-t...1234" in result.output
+        assert "配置已取消" in result.output
+        assert not isolated_config.exists()
+    
+    @patch('src.main.is_terminal_compatible', return_value=True)
+    @patch('src.client.OpenAIClient')
+    def test_cli_interactive_panel_stream_history(self, mock_client_class, mock_compatible):
+        """Test panel streaming in interactive mode records the full reply."""
+        sent = []
+        
+        def fake_stream(history):
+            sent.append(list(history))
+            return iter(["Hel", "lo"])
+        
+        mock_client = Mock()
+        mock_client.chat_with_history_stream.side_effect = fake_stream
+        mock_client_class.return_value = mock_client
+        
+        result = self.runner.invoke(cli, ['-i'], input='hi\nagain\nexit\n')
+        
+        assert result.exit_code == 0
+        assert sent[1][-2] == {"role": "assistant", "content": "Hello"}
+    
+    @patch('src.client.OpenAIClient')
+    def test_cli_interactive_max_history(self, mock_client_class, monkeypatch):
+        """Test CHAT_CLI_MAX_HISTORY trims the history sent to the API."""
+        sent = []
+        mock_client = Mock()
+        mock_client.chat_with_history.side_effect = lambda history: sent.append(list(history)) or "ok"
+        mock_client_class.return_value = mock_client
+        monkeypatch.setenv('CHAT_CLI_MAX_HISTORY', '1')
+        
+        result = self.runner.invoke(cli, ['-i', '--disable-stream'], input='first\nsecond\nexit\n')
+        
+        assert result.exit_code == 0
+        assert [m['content'] for m in sent[1]] == ["You are a helpful assistant", "second"]
+    
+    @patch('src.client.OpenAIClient')
+    def test_cli_config_unchanged_skips_retest(self, mock_client_class, isolated_config):
+        """Test saving an unchanged config reuses the earlier config check."""
+        config_file = isolated_config
+        config_file.write_text(
+            "OPENAI_API_KEY=sk-test-key-1234\n"
+            "OPENAI_BASE_URL=https://api.openai.com/v1\n"
+            "OPENAI_MODEL=gpt-4\n",
+            encoding='utf-8',
+        )
+        
+        with patch('src.main.check_config', wraps=check_config) as mock_check:
+            result = self.runner.invoke(cli, ['--config'], input='y\n\n\n\ny\n')
+        
+        assert result.exit_code == 0
+        assert "配置未变化" in result.output
+        mock_check.assert_called_once()
+        mock_client_class.assert_not_called()
+        assert [p.name for p in config_file.parent.iterdir()] == ["env"]
+        content = config_file.read_text(encoding='utf-8')
+        assert content.startswith("# OpenAI兼容 API 配置\n")
+        assert content.endswith(
+            "\nOPENAI_API_KEY=sk-test-key-1234\n"
+            "OPENAI_BASE_URL=https://api.openai.com/v1\n"
+            "OPENAI_MODEL=gpt-4\n"
+        )
+    
+    @patch('src.client.OpenAIClient')
+    def test_cli_config_retest_uses_saved_values(self, mock_client_class, isolated_config):
+        """Test the post-save check sees the new config, not values loaded from the old file."""
+        isolated_config.write_text(
+            "OPENAI_API_KEY=sk-test-key-1234\n"
+            "OPENAI_BASE_URL=localhost:8000\n",
+            encoding='utf-8',
+        )
+        
+        result = self.runner.invoke(cli, ['--config'], input='y\n\nhttps://api.example.com/v1\n\ny\n')
+        
+        assert result.exit_code == 0
+        assert "配置测试成功" in result.output
+        assert result.output.count("不是有效的 URL") == 1
+    
+    @patch('src.client.OpenAIClient')
+    def test_cli_config_save_keeps_file_mode(self, mock_client_class, isolated_config):
+        """Test saving the config keeps the permissions of the existing file."""
+        config_file = isolated_config
+        config_file.write_text("OPENAI_API_KEY=sk-test-key-1234\n", encoding='utf-8')
+        config_file.chmod(0o600)
+        
+        result = self.runner.invoke(cli, ['--config'], input='y\n\n\ngpt-4\ny\n')
+        
+        assert result.exit_code == 0
+        assert "OPENAI_MODEL=gpt-4\n" in config_file.read_text(encoding='utf-8')
+        assert config_file.stat().st_mode & 0o777 == 0o600
+        assert [p.name for p in config_file.parent.iterdir()] == ["env"]
+    
+    @patch('src.client.OpenAIClient')
+    def test_cli_config_save_through_symlink(self, mock_client_class, isolated_config):
+        """Test saving the config writes through a symlinked config file."""
+        dotfiles = isolated_config.parent / "dotfiles"
+        dotfiles.mkdir()
+        real_file = dotfiles / "env"
+        real_file.write_text("OPENAI_API_KEY=sk-test-key-1234\nOPENAI_MODEL=gpt-4\n", encoding='utf-8')
+        real_file.chmod(0o600)
+        isolated_config.symlink_to(real_file)
+        
+        result = self.runner.invoke(cli, ['--config'], input='y\n\n\ngpt-4o\ny\n')
+        
+        assert result.exit_code == 0
+        assert isolated_config.is_symlink()
+        assert "OPENAI_MODEL=gpt-4o\n" in real_file.read_text(encoding='utf-8')
+        assert real_file.stat().st_mode & 0o777 == 0o600
+        assert [p.name for p in dotfiles.iterdir()] == ["env"]
+    
+    @patch('src.client.OpenAIClient')
+    def test_cli_config_env_directory(self, mock_client_class, isolated_config):
+        """Test --config treats a .env directory in cwd as a missing file."""
+        (isolated_config.parent / ".env").mkdir()
+        os.environ['OPENAI_API_KEY'] = 'sk-test-key-1234'
+        
+        result = self.runner.invoke(cli, ['--config'], input='n\n')
+        
+        assert result.exit_code == 0
+        assert "配置有效" in result.output
+    
+    def test_check_config_rejects_invalid_base_url(self):
+        """Test the config check validates the base URL without building a client."""
+        with patch.dict('os.environ', {'OPENAI_API_KEY': 'sk-test', 'OPENAI_BASE_URL': 'localhost:8000'}, clear=True), \
+                patch('src.client.load_env_files'):
+            with pytest.raises(ValueError, match="OPENAI_BASE_URL"):
+                check_config()
+
+
+class TestModuleLayout:
+    """Test that shared helpers have a single definition."""
+    
+    def test_config_paths_shared_with_client(self):
+        """Test main reuses the client's cached config path helper."""
+        import inspect
+        from src import client, main
+        
+        assert main.get_config_file is client.get_config_file
+        assert inspect.getsourcefile(client.OpenAIClient) == inspect.getsourcefile(inspect.unwrap(main.get_config_file))
+
+
+class TestMask:
+    """Test sensitive value masking."""
+    
+    def test_mask_long_value(self):
+        """Test long values keep their first and last four characters."""
+        from src.main import _mask
+        
+        assert _mask("sk-abcdefgh1234") == "sk-a...1234"
+    
+    def test_mask_short_value(self):
+        """Test short values are fully hidden."""
+        from src.main import _mask
+        
+        assert _mask("short") == "***"
+
+
+class TestTerminalCompatibility:
+    """Test terminal capability detection."""
+    
+    def setup_method(self):
+        """Clear the cached detection result."""
+        from src.main import is_terminal_compatible
+        is_terminal_compatible.cache_clear()
+    
+    teardown_method = setup_method
+    
+    def test_modern_terminal_program(self):
+        """Test known terminal programs are compatible even over SSH."""
+        from src.main import is_terminal_compatible
+        
+        with patch.dict('os.environ', {'TERM_PROGRAM': 'vscode', 'SSH_TTY': '/dev/pts/0'}, clear=True):
+            assert is_terminal_compatible() is True
+    
+    def test_ssh_session(self):
+        """Test SSH sessions fall back to simple rendering."""
+        from src.main import is_terminal_compatible
+        
+        with patch.dict('os.environ', {'TERM': 'xterm-256color', 'SSH_CLIENT': '1.2.3.4'}, clear=True):
+            assert is_terminal_compatible() is False
+    
+    def test_problematic_term(self):
+        """Test basic consoles are not compatible."""
+        from src.main import is_terminal_compatible
+        
+        with patch.dict('os.environ', {'TERM': 'linux'}, clear=True):
+            assert is_terminal_compatible() is False
+    
+    def test_256color_term(self):
+        """Test 256-color TERM values are compatible."""
+        from src.main import is_terminal_compatible
+        
+        with patch.dict('os.environ', {'TERM': 'tmux-256color'}, clear=True):
+            assert is_terminal_compatible() is True
@@ -0,0 +1,37 @@
+"""Test setup.py helper commands."""
+
+import importlib.util
+from pathlib import Path
+
+SETUP_PY = Path(__file__).resolve().parent.parent / "setup.py"
+
+
+def load_setup_module():
+    """Import setup.py without running setup()."""
+    spec = importlib.util.spec_from_file_location("chat_cli_setup", SETUP_PY)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class TestCleanBuild:
+    """Test the clean command."""
+    
+    def test_clean_keeps_nested_build_dirs(self, tmp_path):
+        """Test clean only removes build artifacts at the project root."""
+        for name in ["build", "dist", "chat_cli.egg-info", "src/__pycache__",
+                     "docs/build", ".tox/py311/lib/site-packages/build",
+                     "env/lib/site-packages/build", "env/lib/__pycache__"]:
+            (tmp_path / name).mkdir(parents=True)
+        (tmp_path / "env" / "pyvenv.cfg").write_text("")
+        
+        load_setup_module().clean_build(tmp_path)
+        
+        assert not (tmp_path / "build").exists()
+        assert not (tmp_path / "dist").exists()
+        assert not (tmp_path / "chat_cli.egg-info").exists()
+        assert not (tmp_path / "src" / "__pycache__").exists()
+        assert (tmp_path / "docs" / "build").is_dir()
+        assert (tmp_path / ".tox" / "py311" / "lib" / "site-packages" / "build").is_dir()
+        assert (tmp_path / "env" / "lib" / "site-packages" / "build").is_dir()
+        assert (tmp_path / "env" / "lib" / "__pycache__").is_dir()